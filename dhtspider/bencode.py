@@ -0,0 +1,135 @@
+"""
+bencode 编解码。
+
+直接在 bytes 上按下标扫描，不构造中间 token 对象；字典的键保持为 bytes，
+与 `msg[b'y']` 这类访问方式一致。编码时字典按键排序（BEP 3 规范格式），
+str 按 UTF-8 编码为字节串。
+"""
+
+
+class BencodeError(ValueError):
+    """
+    输入不是合法的 bencode 数据，或包含无法编码的类型。
+    """
+
+
+def bdecode(data):
+    """
+    解码 bencode 数据。末尾多余的字节会被忽略。
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    try:
+        value, _ = _decode(data, 0)
+    except (IndexError, ValueError, TypeError, KeyError) as e:
+        raise BencodeError("无效的 bencode 数据: %s" % e) from None
+    return value
+
+
+def _decode_int(data, i):
+    end = data.index(b'e', i)
+    return int(data[i + 1:end]), end + 1
+
+
+def _decode_bytes(data, i):
+    colon = data.index(b':', i)
+    start = colon + 1
+    end = start + int(data[i:colon])
+    if end > len(data) or end < start:
+        raise ValueError("字符串长度越界")
+    return data[start:end], end
+
+
+def _decode_list(data, i):
+    result = []
+    i += 1
+    while data[i] != 0x65:  # 'e'
+        value, i = _decode(data, i)
+        result.append(value)
+    return result, i + 1
+
+
+def _decode_dict(data, i):
+    result = {}
+    i += 1
+    while data[i] != 0x65:  # 'e'
+        key, i = _decode_bytes(data, i)
+        result[key], i = _decode(data, i)
+    return result, i + 1
+
+
+_DECODERS = {ord('i'): _decode_int, ord('l'): _decode_list, ord('d'): _decode_dict}
+_DECODERS.update({c: _decode_bytes for c in b'0123456789'})
+
+
+def _decode(data, i):
+    return _DECODERS[data[i]](data, i)
+
+
+def bencode(obj):
+    """
+    将 bytes/str/int/list/tuple/dict 编码为 bencode 字节串。
+    """
+    out = []
+    _encode(obj, out)
+    return b''.join(out)
+
+
+def _encode_bytes(obj, out):
+    out.append(b'%d:' % len(obj))
+    out.append(obj)
+
+
+def _encode_str(obj, out):
+    _encode_bytes(obj.encode('utf-8'), out)
+
+
+def _encode_int(obj, out):
+    out.append(b'i%de' % obj)
+
+
+def _encode_list(obj, out):
+    out.append(b'l')
+    for item in obj:
+        _encode(item, out)
+    out.append(b'e')
+
+
+def _encode_dict(obj, out):
+    out.append(b'd')
+    items = [(k.encode('utf-8') if type(k) is str else k, v) for k, v in obj.items()]
+    items.sort(key=_first)
+    for key, value in items:
+        out.append(b'%d:' % len(key))
+        out.append(key)
+        _encode(value, out)
+    out.append(b'e')
+
+
+def _first(item):
+    return item[0]
+
+
+_ENCODERS = {
+    bytes: _encode_bytes,
+    str: _encode_str,
+    int: _encode_int,
+    list: _encode_list,
+    tuple: _encode_list,
+    dict: _encode_dict,
+}
+
+
+def _encode(obj, out):
+    encoder = _ENCODERS.get(type(obj))
+    if encoder is None:
+        # 子类（OrderedDict、bool 等）以及 bytearray/memoryview 走较慢的路径
+        if isinstance(obj, (bytearray, memoryview)):
+            encoder, obj = _encode_bytes, bytes(obj)
+        else:
+            for base, encoder in _ENCODERS.items():
+                if isinstance(obj, base):
+                    break
+            else:
+                raise BencodeError("不支持的类型: %s" % type(obj).__name__)
+    encoder(obj, out)
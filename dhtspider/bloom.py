@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+
+from bitarray import bitarray
+
+
+class BloomFilter:
+    """
+    针对 info_hash 的布隆过滤器。
+
+    info_hash 本身就是 SHA1 摘要，分布足够均匀，因此不再重复哈希：
+    取前 16 字节拆成两个 64 位整数 h1、h2，按 Kirsch–Mitzenmacher
+    双重哈希 h1 + i*h2 (mod m) 得到 k 个比特位。
+
+    通过 open() 得到的过滤器以 mmap 映射文件，置位直接落在页缓存中，
+    由内核按页异步写回，不需要在退出时整体序列化。
+    多个进程共享同一个文件时，比特位是共用的，但 count 只统计本进程插入的元素，
+    flush 时各进程的 count 互相覆盖，文件头中的计数仅供参考。
+    """
+    FILE_MAGIC = b'DHTBLOOM'
+    FILE_HEADER = struct.Struct('<8sQQQQd')
+
+    def __init__(self, capacity, error_rate=0.001):
+        num_bits, num_hashes = self._params(capacity, error_rate)
+        self._setup(capacity, error_rate, num_bits, num_hashes, 0)
+        self.bits = bitarray(num_bits, endian='little')
+        self.bits.setall(False)
+
+    @staticmethod
+    def _params(capacity, error_rate):
+        if not (0 < error_rate < 1):
+            raise ValueError("error_rate 必须在 0 和 1 之间")
+        if not capacity > 0:
+            raise ValueError("capacity 必须大于 0")
+        num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, int(round(num_bits / capacity * math.log(2))))
+        return num_bits, num_hashes
+
+    def _setup(self, capacity, error_rate, num_bits, num_hashes, count):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.count = count
+        self._mmap = None
+        self._view = None
+
+    def _pack_header(self):
+        return self.FILE_HEADER.pack(
+            self.FILE_MAGIC, self.capacity, self.num_bits,
+            self.num_hashes, self.count, self.error_rate
+        )
+
+    @classmethod
+    def _unpack_header(cls, header):
+        if len(header) != cls.FILE_HEADER.size:
+            raise ValueError("布隆过滤器文件头不完整")
+        magic, capacity, num_bits, num_hashes, count, error_rate = cls.FILE_HEADER.unpack(header)
+        if magic != cls.FILE_MAGIC:
+            raise ValueError("不是有效的布隆过滤器文件")
+        bloom = cls.__new__(cls)
+        bloom._setup(capacity, error_rate, num_bits, num_hashes, count)
+        return bloom
+
+    def _hashes(self, key):
+        if len(key) < 16:
+            key = hashlib.sha1(key).digest()
+        h1, h2 = _UNPACK_H1_H2(key)
+        # h2 取奇数，避免 h2 为 0 时 k 个位置全部重合
+        return h1, h2 | 1
+
+    def __contains__(self, key):
+        h, step = self._hashes(key)
+        bits = self.bits
+        m = self.num_bits
+        for _ in range(self.num_hashes):
+            if not bits[h % m]:
+                return False
+            h += step
+        return True
+
+    def __len__(self):
+        """
+        已插入的（不重复的）元素数量。
+        """
+        return self.count
+
+    def add(self, key):
+        """
+        添加元素。如果元素此前已存在则返回 True，否则返回 False。
+        """
+        h, step = self._hashes(key)
+        bits = self.bits
+        m = self.num_bits
+        found = True
+        for _ in range(self.num_hashes):
+            i = h % m
+            if not bits[i]:
+                found = False
+                bits[i] = True
+            h += step
+        if not found:
+            self.count += 1
+        return found
+
+    def tofile(self, f):
+        """
+        将过滤器写入文件对象 f。
+        """
+        f.write(self._pack_header())
+        self.bits.tofile(f)
+
+    @classmethod
+    def fromfile(cls, f):
+        """
+        从文件对象 f 读取由 tofile 写入的过滤器。
+        """
+        bloom = cls._unpack_header(f.read(cls.FILE_HEADER.size))
+        bloom.bits = bitarray(endian='little')
+        bloom.bits.fromfile(f)
+        if len(bloom.bits) < bloom.num_bits:
+            raise ValueError("布隆过滤器文件长度不匹配")
+        del bloom.bits[bloom.num_bits:]
+        return bloom
+
+    @classmethod
+    def open(cls, path, capacity, error_rate=0.001):
+        """
+        打开（或创建）一个以 mmap 映射到 path 的过滤器，文件格式与 tofile 相同。
+        文件已存在时沿用文件中的参数，忽略 capacity 和 error_rate。
+        """
+        header_size = cls.FILE_HEADER.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            file_size = os.fstat(fd).st_size
+            if file_size == 0:
+                num_bits, num_hashes = cls._params(capacity, error_rate)
+                bloom = cls.__new__(cls)
+                bloom._setup(capacity, error_rate, num_bits, num_hashes, 0)
+                # 新文件通过 ftruncate 扩展，未写入的页在磁盘上是稀疏的
+                os.ftruncate(fd, header_size + (num_bits + 7) // 8)
+                os.pwrite(fd, bloom._pack_header(), 0)
+            else:
+                bloom = cls._unpack_header(os.pread(fd, header_size, 0))
+                if file_size < header_size + (bloom.num_bits + 7) // 8:
+                    raise ValueError("布隆过滤器文件长度不匹配")
+            size = header_size + (bloom.num_bits + 7) // 8
+            bloom._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        bloom._view = memoryview(bloom._mmap)[header_size:size]
+        bloom.bits = bitarray(buffer=bloom._view, endian='little')
+        return bloom
+
+    def flush(self):
+        """
+        将计数写回文件头并 msync。仅对 open() 得到的过滤器有效。
+        """
+        if self._mmap is None:
+            return
+        self._mmap[:self.FILE_HEADER.size] = self._pack_header()
+        self._mmap.flush()
+
+    def close(self):
+        """
+        flush 后解除映射。之后不能再使用该过滤器。
+        """
+        if self._mmap is None:
+            return
+        self.flush()
+        self.bits = None
+        self._view.release()
+        self._mmap.close()
+        self._view = None
+        self._mmap = None
+
+
+def open_bloom_filter(path, capacity, error_rate=0.001):
+    """
+    以 BloomFilter.open 打开 path。文件无法加载时将其改名为 path.bak 保留，再重新创建。
+    """
+    try:
+        return BloomFilter.open(path, capacity, error_rate)
+    except ValueError as e:
+        logging.warning("无法加载布隆过滤器 %s: %s，已备份为 %s.bak 并重新创建。", path, e, path)
+    # 保留损坏或参数不匹配的文件，以便人工检查或恢复，而不是直接删除
+    os.replace(path, path + ".bak")
+    return BloomFilter.open(path, capacity, error_rate)
+
+
+_UNPACK_H1_H2 = struct.Struct('<QQ').unpack_from
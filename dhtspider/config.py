@@ -7,6 +7,13 @@ default_config = {
     # 网络相关配置
     "HOST": "0.0.0.0",
     "PORT": 6881,
+    # 爬虫进程数量。大于 1 时各进程通过 SO_REUSEPORT 共享同一端口（仅 Linux 等平台支持），
+    # 布隆过滤器文件以共享映射的方式在进程间共用（状态报告中的去重计数只统计本进程）
+    "WORKERS": 1,
+    # 是否将每个爬虫进程绑定到单独的 CPU（仅支持 sched_setaffinity 的平台）
+    "PIN_CPUS": False,
+    # UDP 套接字接收缓冲区大小（字节），实际上限受 net.core.rmem_max 限制
+    "UDP_RECV_BUFFER_SIZE": 8 * 1024 * 1024,
 
     # DHT 引导节点
     "BOOTSTRAP_NODES": [
@@ -19,15 +26,26 @@ default_config = {
     "BLOOM_FILTER_CAPACITY": 100000000,
     "BLOOM_FILTER_ERROR_RATE": 0.0001,
     "BLOOM_FILTER_FILE": "seen_info_hashes.bloom",
+    # 布隆过滤器文件 msync 的间隔（秒）
+    "BLOOM_FILTER_SYNC_INTERVAL": 60,
 
     # 存储相关配置
     "STORAGE_DIR": "bt",
 
     # 元数据抓取器配置
+    # 同时进行的抓取数量（worker 数量）
     "FETCHER_SEMAPHORE_LIMIT": 100,
+    # 等待抓取的任务队列长度
+    "FETCHER_QUEUE_SIZE": 1000,
+    # 同一个 infohash 抓取失败时最多再尝试的其它 peer 数量
+    "FETCHER_MAX_PEERS": 3,
 
     # 节点发现任务配置
     "FIND_NODES_INTERVAL": 60,
+    # 每轮节点发现中记录的已探测节点数量上限
+    "PROBED_NODES_LIMIT": 100000,
+    # 引导节点 DNS 重新解析间隔（秒）
+    "BOOTSTRAP_RESOLVE_INTERVAL": 3600,
 
     # 状态报告配置
     "STATUS_REPORT_INTERVAL": 30,
@@ -1,6 +1,25 @@
 import asyncio
 import hashlib
-import bencoding
+import struct
+
+from .bencode import bencode, bdecode
+
+# 消息长度前缀（4 字节大端）与扩展消息 ID（1 字节）
+_UINT32 = struct.Struct('>I')
+_UINT8 = struct.Struct('>B')
+
+# ut_metadata 的片段大小（BEP 9），以及愿意接收的元数据上限
+METADATA_PIECE_SIZE = 16384
+MAX_METADATA_SIZE = 10 * 1024 * 1024
+
+# 我们在扩展握手中为 ut_metadata 声明的消息 ID
+UT_METADATA_ID = 1
+
+# BT 握手的固定前缀（协议名 + 保留位，声明支持扩展协议），后接 info_hash 和 peer_id
+_HANDSHAKE_PREFIX = b'\x13BitTorrent protocol\x00\x00\x00\x00\x00\x10\x00\x00'
+# 扩展握手消息（含长度前缀）对所有连接都相同，预先编码
+_EXT_HANDSHAKE_PAYLOAD = b'\x14\x00' + bencode({b"m": {b"ut_metadata": UT_METADATA_ID}})
+_EXT_HANDSHAKE_MSG = _UINT32.pack(len(_EXT_HANDSHAKE_PAYLOAD)) + _EXT_HANDSHAKE_PAYLOAD
 
 
 class MetadataFetcher:
@@ -14,7 +33,7 @@ class MetadataFetcher:
         self.our_peer_id = our_peer_id
         self.reader = None
         self.writer = None
-        self.my_ut_metadata_id = 1
+        self.my_ut_metadata_id = UT_METADATA_ID
 
     async def fetch(self):
         """
@@ -40,9 +59,9 @@ class MetadataFetcher:
     async def _handshake(self):
         """
         执行 BitTorrent 协议握手。
+        扩展握手（BEP 10）紧跟在 BT 握手之后一次性写出，只需一次 drain。
         """
-        handshake_msg = b'\x13BitTorrent protocol\x00\x00\x00\x00\x00\x10\x00\x00' + self.info_hash + self.our_peer_id
-        self.writer.write(handshake_msg)
+        self.writer.write(_HANDSHAKE_PREFIX + self.info_hash + self.our_peer_id + _EXT_HANDSHAKE_MSG)
         await self.writer.drain()
         response = await asyncio.wait_for(self.reader.readexactly(68), timeout=5)
         if response[28:48] != self.info_hash:
@@ -50,21 +69,20 @@ class MetadataFetcher:
 
     async def _extended_handshake_loop(self):
         """
-        执行扩展握手并处理来自 peer 的消息。
+        处理来自 peer 的扩展消息（扩展握手已随 BT 握手一起发出）。
         """
-        extended_handshake_payload = bencoding.bencode({b"m": {b"ut_metadata": self.my_ut_metadata_id}})
-        msg = b'\x14\x00' + extended_handshake_payload
-        msg_len = len(msg).to_bytes(4, 'big')
-        self.writer.write(msg_len + msg)
-        await self.writer.drain()
-
         peer_ut_metadata_id = None
-        metadata_size = None
-        metadata_pieces = []
+        metadata_size = 0
+        metadata = None
+        received = []
+        remaining = 0
+        # 已按顺序送入 SHA1 的片段数；乱序到达的片段等前面的片段到齐后再补上
+        hasher = hashlib.sha1()
+        hashed = 0
 
         while True:
             len_prefix = await asyncio.wait_for(self.reader.readexactly(4), timeout=10)
-            msg_len = int.from_bytes(len_prefix, 'big')
+            msg_len, = _UINT32.unpack(len_prefix)
             if msg_len == 0:
                 continue
 
@@ -76,43 +94,62 @@ class MetadataFetcher:
                 payload = message[2:]
 
                 if extended_msg_id == 0:
-                    decoded_payload = bencoding.bdecode(payload)
+                    decoded_payload = bdecode(payload)
                     peer_ut_metadata_id = decoded_payload.get(b'm', {}).get(b'ut_metadata')
                     metadata_size = decoded_payload.get(b'metadata_size')
                     if peer_ut_metadata_id and metadata_size:
-                        num_pieces = (metadata_size + 16383) // 16384
-                        metadata_pieces = [None] * num_pieces
-                        for i in range(num_pieces):
-                            await self._request_metadata_piece(peer_ut_metadata_id, i)
-
-                elif peer_ut_metadata_id and extended_msg_id == peer_ut_metadata_id:
+                        if not 0 < metadata_size <= MAX_METADATA_SIZE:
+                            return
+                        num_pieces = (metadata_size + METADATA_PIECE_SIZE - 1) // METADATA_PIECE_SIZE
+                        metadata = bytearray(metadata_size)
+                        received = [False] * num_pieces
+                        remaining = num_pieces
+                        # 所有片段请求合并为一次写入
+                        self.writer.write(b''.join(
+                            self._metadata_piece_request(peer_ut_metadata_id, i)
+                            for i in range(num_pieces)
+                        ))
+                        await self.writer.drain()
+
+                # peer 按我们在扩展握手中声明的 ID 回复 ut_metadata 消息（BEP 9）
+                elif metadata is not None and extended_msg_id == self.my_ut_metadata_id:
                     try:
                         bencoded_end = payload.find(b'ee') + 2
-                        metadata_dict = bencoding.bdecode(payload[:bencoded_end])
+                        metadata_dict = bdecode(payload[:bencoded_end])
                         piece_index = metadata_dict[b'piece']
                         piece_data = payload[bencoded_end:]
 
-                        if piece_index < len(metadata_pieces):
-                            metadata_pieces[piece_index] = piece_data
+                        if not 0 <= piece_index < len(received) or received[piece_index]:
+                            continue
+                        start = piece_index * METADATA_PIECE_SIZE
+                        if len(piece_data) != min(METADATA_PIECE_SIZE, metadata_size - start):
+                            return
 
-                        if all(p is not None for p in metadata_pieces):
-                            full_metadata = b''.join(metadata_pieces)
-                            if hashlib.sha1(full_metadata).digest() == self.info_hash:
-                                parsed_metadata = bencoding.bdecode(full_metadata)
-                                await self.on_metadata_callback(self.info_hash, parsed_metadata)
+                        metadata[start:start + len(piece_data)] = piece_data
+                        received[piece_index] = True
+                        remaining -= 1
+
+                        view = memoryview(metadata)
+                        while hashed < len(received) and received[hashed]:
+                            hasher.update(view[hashed * METADATA_PIECE_SIZE:(hashed + 1) * METADATA_PIECE_SIZE])
+                            hashed += 1
+                        view.release()
+
+                        if remaining == 0:
+                            if hasher.digest() == self.info_hash:
+                                # 同时回传原始字节，保存时无需重新编码
+                                parsed_metadata = bdecode(metadata)
+                                await self.on_metadata_callback(self.info_hash, parsed_metadata, bytes(metadata))
                             return
                     except Exception:
                         return
 
-    async def _request_metadata_piece(self, peer_ut_metadata_id, piece_index):
+    def _metadata_piece_request(self, peer_ut_metadata_id, piece_index):
         """
-        请求一个元数据片段。
+        构造请求一个元数据片段的消息（含长度前缀），由调用方合并写入。
         """
         request = {b'msg_type': 0, b'piece': piece_index}
-        encoded_request = bencoding.bencode(request)
-
-        msg = b'\x14' + peer_ut_metadata_id.to_bytes(1, 'big') + encoded_request
-        msg_len = len(msg).to_bytes(4, 'big')
+        encoded_request = bencode(request)
 
-        self.writer.write(msg_len + msg)
-        await self.writer.drain()
+        msg = b'\x14' + _UINT8.pack(peer_ut_metadata_id) + encoded_request
+        return _UINT32.pack(len(msg)) + msg
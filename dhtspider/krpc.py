@@ -0,0 +1,48 @@
+"""
+KRPC 报文的预编码模板。
+
+报文中只有事务 ID `t`、节点 ID `id` 等少数字段会变化，其余部分是常量，
+因此直接用字节串模板拼接，省去构造字典和递归 bencode 编码的开销。
+输出与对等字典经 bencode 编码后的结果逐字节一致（键按规范顺序排列）。
+"""
+
+# {"r": {"id": <id>}, "t": <t>, "y": "r"}，ping 与 announce_peer 共用
+_PING_RESPONSE = b'd1:rd2:id%d:%se1:t%d:%s1:y1:re'
+# {"r": {"id": <id>, "nodes": ""}, "t": <t>, "y": "r"}
+_FIND_NODE_RESPONSE = b'd1:rd2:id%d:%s5:nodes0:e1:t%d:%s1:y1:re'
+# {"r": {"id": <id>, "nodes": "", "token": <token>}, "t": <t>, "y": "r"}
+_GET_PEERS_RESPONSE = b'd1:rd2:id%d:%s5:nodes0:5:token%d:%se1:t%d:%s1:y1:re'
+# {"a": {"id": <id>, "target": <target>}, "q": "find_node", "t": <t>, "y": "q"}
+_FIND_NODE_QUERY = b'd1:ad2:id%d:%s6:target%d:%se1:q9:find_node1:t%d:%s1:y1:qe'
+
+
+def find_node_query(trans_id, node_id, target):
+    """
+    构造 find_node 查询。
+    """
+    return _FIND_NODE_QUERY % (
+        len(node_id), node_id, len(target), target, len(trans_id), trans_id
+    )
+
+
+def ping_response(trans_id, node_id):
+    """
+    构造 ping / announce_peer 的响应。
+    """
+    return _PING_RESPONSE % (len(node_id), node_id, len(trans_id), trans_id)
+
+
+def find_node_response(trans_id, node_id):
+    """
+    构造 find_node 的响应（不返回任何节点）。
+    """
+    return _FIND_NODE_RESPONSE % (len(node_id), node_id, len(trans_id), trans_id)
+
+
+def get_peers_response(trans_id, node_id, token):
+    """
+    构造 get_peers 的响应（不返回任何节点，附带 token）。
+    """
+    return _GET_PEERS_RESPONSE % (
+        len(node_id), node_id, len(token), token, len(trans_id), trans_id
+    )
@@ -0,0 +1,182 @@
+"""
+通过 ctypes 绑定 Linux 的 sendmmsg(2)/recvmmsg(2)，一次系统调用收发多个 UDP 数据报。
+在不支持的平台上 HAS_SENDMMSG/HAS_RECVMMSG 为 False，调用方应退回逐个 sendto/recvfrom。
+"""
+import ctypes
+import ctypes.util
+import os
+import socket
+import struct
+import sys
+
+# 单次 sendmmsg/recvmmsg 调用最多携带的数据报数量
+MAX_BATCH = 64
+# recvmmsg 每个接收缓冲区的大小，超出的数据报会被截断并丢弃
+MSG_BUFSIZE = 2048
+
+_MSG_TRUNC = 0x20
+_MSG_DONTWAIT = 0x40
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class _SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_uint32),
+        ("sin_zero", ctypes.c_char * 8),
+    ]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.c_void_p),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", _MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+def _load_libc_func(name, argtypes):
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = argtypes
+    func.restype = ctypes.c_int
+    return func
+
+
+_sendmmsg = _load_libc_func(
+    "sendmmsg", [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+)
+_recvmmsg = _load_libc_func(
+    "recvmmsg", [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+)
+HAS_SENDMMSG = _sendmmsg is not None
+HAS_RECVMMSG = _recvmmsg is not None
+
+
+def _raise_errno():
+    errno = ctypes.get_errno()
+    raise OSError(errno, os.strerror(errno))
+
+
+def _fill_sockaddr(sa, addr):
+    host, port = addr
+    sa.sin_family = socket.AF_INET
+    sa.sin_port = socket.htons(port)
+    sa.sin_addr = struct.unpack("=I", socket.inet_aton(host))[0]
+
+
+def check_sockaddr(addr):
+    """
+    检查 addr 能否编码为 IPv4 sockaddr。
+    不是数字形式的 IPv4 地址（例如主机名）时抛出 OSError；
+    不是 (host, port) 二元组或端口越界时抛出 ValueError、TypeError 或 OverflowError。
+    """
+    _fill_sockaddr(_SockAddrIn(), addr)
+
+
+def sendmmsg(fd, packets):
+    """
+    将 [(payload, (ip, port)), ...] 通过一次 sendmmsg 发送出去。
+    返回内核实际发送的数据报数量；出错时抛出 OSError（例如 EAGAIN）。
+    地址的要求与 check_sockaddr 相同，不满足时抛出相应的异常，一个数据报也不会发送。
+    """
+    n = len(packets)
+    msgs = (_MMsgHdr * n)()
+    iovs = (_IOVec * n)()
+    addrs = (_SockAddrIn * n)()
+    # 保持对缓冲区的引用，直到系统调用返回
+    bufs = []
+    for i, (data, addr) in enumerate(packets):
+        buf = ctypes.c_char_p(data)
+        bufs.append(buf)
+        iovs[i].iov_base = ctypes.cast(buf, ctypes.c_void_p)
+        iovs[i].iov_len = len(data)
+
+        _fill_sockaddr(addrs[i], addr)
+
+        hdr = msgs[i].msg_hdr
+        hdr.msg_name = ctypes.addressof(addrs[i])
+        hdr.msg_namelen = ctypes.sizeof(_SockAddrIn)
+        hdr.msg_iov = ctypes.addressof(iovs[i])
+        hdr.msg_iovlen = 1
+
+    sent = _sendmmsg(fd, msgs, n, 0)
+    if sent < 0:
+        _raise_errno()
+    return sent
+
+
+class RecvMmsg:
+    """
+    预先分配好 mmsghdr 数组和接收缓冲区，通过 recvmmsg 一次读取多个数据报，
+    避免每次调用都重新分配。
+    Spider.listen 在事件循环支持 add_reader 时（asyncio 的 selector 循环和 uvloop）
+    用它读取自己创建的套接字，只有 Proactor 等不支持 add_reader 的循环才退回逐个接收。
+    """
+    def __init__(self, vlen=MAX_BATCH, bufsize=MSG_BUFSIZE):
+        self.vlen = vlen
+        self.bufsize = bufsize
+        self._buf = (ctypes.c_char * (vlen * bufsize))()
+        self._msgs = (_MMsgHdr * vlen)()
+        self._iovs = (_IOVec * vlen)()
+        self._addrs = (_SockAddrIn * vlen)()
+
+        base = ctypes.addressof(self._buf)
+        for i in range(vlen):
+            self._iovs[i].iov_base = base + i * bufsize
+            self._iovs[i].iov_len = bufsize
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self._addrs[i])
+            hdr.msg_iov = ctypes.addressof(self._iovs[i])
+            hdr.msg_iovlen = 1
+
+    def recv(self, fd):
+        """
+        非阻塞地读取最多 vlen 个数据报，返回 [(data, (ip, port)), ...]。
+        没有数据可读时抛出 BlockingIOError。
+        """
+        msgs = self._msgs
+        addrlen = ctypes.sizeof(_SockAddrIn)
+        for i in range(self.vlen):
+            msgs[i].msg_hdr.msg_namelen = addrlen
+
+        n = _recvmmsg(fd, msgs, self.vlen, _MSG_DONTWAIT, None)
+        if n < 0:
+            _raise_errno()
+
+        packets = []
+        view = memoryview(self._buf).cast('B')
+        for i in range(n):
+            msg = msgs[i]
+            if msg.msg_hdr.msg_flags & _MSG_TRUNC:
+                continue
+            addr = self._addrs[i]
+            start = i * self.bufsize
+            packets.append((
+                bytes(view[start:start + msg.msg_len]),
+                (socket.inet_ntoa(struct.pack("=I", addr.sin_addr)), socket.ntohs(addr.sin_port)),
+            ))
+        return packets
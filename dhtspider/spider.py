@@ -1,20 +1,17 @@
 import asyncio
+import collections
+import itertools
 import logging
 import hashlib
 import socket
 
-import bencoding as bencoder
-from pybloom_live import BloomFilter
-
+from . import bencode as bencoder
+from . import krpc
 from .utils import generate_node_id, decode_nodes
 from .fetcher import MetadataFetcher
 from .storage import Storage
-
-BOOTSTRAP_NODES = (
-    ("router.bittorrent.com", 6881),
-    ("dht.transmissionbt.com", 6881),
-    ("router.utorrent.com", 6881)
-)
+from .bloom import open_bloom_filter
+from .mmsg import sendmmsg, check_sockaddr, RecvMmsg, HAS_SENDMMSG, HAS_RECVMMSG, MAX_BATCH, MSG_BUFSIZE
 
 class Spider(asyncio.DatagramProtocol):
     """
@@ -26,52 +23,153 @@ class Spider(asyncio.DatagramProtocol):
         self.transport = None
         self.node_id = generate_node_id()
         self.peer_id = hashlib.sha1(self.node_id).digest()
+        # _fake_node_id 在每个响应中都会用到，预先取出节点 ID 的最后一个字节
+        self._node_id_last = self.node_id[-1:]
 
         self.storage = Storage(self.config)
         self.seen_info_hashes = self._load_bloom_filter()
-        self.fetcher_semaphore = asyncio.Semaphore(self.config["FETCHER_SEMAPHORE_LIMIT"])
+        # 有界的抓取队列，由固定数量的 worker 消费；队列满时直接丢弃新的任务
+        self._fetch_queue = asyncio.Queue(maxsize=self.config["FETCHER_QUEUE_SIZE"])
+        self._fetch_workers = []
+        self._background_tasks = []
+        self._fetch_worker_count = self.config["FETCHER_SEMAPHORE_LIMIT"]
+        # 已排队或正在抓取的 infohash -> (已尝试或已排队的 peer 集合, 待尝试的备选 peer)。
+        # 同一个种子不会被并发重复抓取，但当前 peer 失败时可以换一个 peer 重试；
+        # 集合包含第一个 peer 且只增不减，因此每个种子最多尝试 1 + FETCHER_MAX_PEERS 个 peer
+        self._pending_fetches = {}
+        self._fetch_peer_limit = self.config["FETCHER_MAX_PEERS"]
 
         self.metadata_fetched_count = 0
         self.__running = False
 
+        # 发送队列：同一轮事件循环内产生的数据报合并后一次性发送
+        self._pending = collections.deque()
+        self._flush_scheduled = False
+        self._draining = False
+        self._sock_fd = None
+        # 不经过 transport、直接由事件循环的 add_reader 驱动的套接字（recvmmsg 路径）
+        self._sock = None
+        self._receiver = None
+
+        self._query_handlers = {
+            b'get_peers': self._on_get_peers,
+            b'announce_peer': self._on_announce_peer,
+            b'find_node': self._on_find_node,
+            b'ping': self._on_ping,
+        }
+
+        # 最近探测过的节点地址，数量超过上限时清空
+        self._probed_nodes = set()
+        self._probed_nodes_limit = self.config["PROBED_NODES_LIMIT"]
+
+        # 引导节点的解析结果，避免每轮节点发现都查询 DNS
+        self._bootstrap_nodes = tuple(self.config["BOOTSTRAP_NODES"])
+        self._bootstrap_addrs = {}
+
     # --- Top-level control ---
     def start(self, port=6881):
-        coro = self.loop.create_datagram_endpoint(
-            lambda: self, local_addr=('0.0.0.0', port)
-        )
         try:
-            self.transport, _ = self.loop.run_until_complete(coro)
+            self.listen(port)
             logging.info("DHT Spider (maga-style) 正在监听 0.0.0.0:%d", port)
         except OSError as e:
             logging.error("无法监听在 0.0.0.0:%d - %s", port, e)
             return
 
-        # Bootstrap
-        for host, port in BOOTSTRAP_NODES:
-            # Use ensure_future for async calls from sync method
-            asyncio.ensure_future(self.find_node(addr=(host, port)), loop=self.loop)
-
+        # Bootstrap 在 auto_find_nodes 的第一轮完成
         self.__running = True
-        asyncio.ensure_future(self.auto_find_nodes(), loop=self.loop)
-        asyncio.ensure_future(self._report_status(), loop=self.loop)
+        self._background_tasks = [
+            self.loop.create_task(coro) for coro in (
+                self.auto_find_nodes(),
+                self._refresh_bootstrap_addrs(),
+                self._report_status(),
+                self._sync_bloom_filter(),
+            )
+        ]
 
     def stop(self):
         self.__running = False
+        for task in self._background_tasks + self._fetch_workers:
+            task.cancel()
+        self._background_tasks = []
+        self._fetch_workers = []
+        if self._sock is not None:
+            self._close_socket()
+        if self.transport:
+            self.transport.close()
         try:
-            bloom_filter_file = self.config["BLOOM_FILTER_FILE"]
-            with open(bloom_filter_file, 'wb') as f:
-                self.seen_info_hashes.tofile(f)
-            logging.info("布隆过滤器已成功保存到 %s。", bloom_filter_file)
+            # 过滤器映射在文件上，只需同步并解除映射
+            self.seen_info_hashes.close()
+            logging.info("布隆过滤器已成功同步到 %s。", self.config["BLOOM_FILTER_FILE"])
         except Exception as e:
-            logging.error("保存布隆过滤器时出错: %s", e)
+            logging.error("同步布隆过滤器时出错: %s", e)
+
+    def listen(self, port, host='0.0.0.0'):
+        """
+        创建并绑定 UDP 套接字。支持 recvmmsg 且事件循环支持 add_reader 时（包括 uvloop），
+        直接由 add_reader 驱动套接字，收发分别通过 recvmmsg 和 sendmmsg 批量进行；
+        否则（非 Linux 平台、Proactor 事件循环）交给 create_datagram_endpoint，
+        由 transport 逐个收发。失败时抛出 OSError。
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if self.config["WORKERS"] > 1:
+                # 多进程运行时各进程绑定同一端口，由内核在套接字之间分配数据报
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            # 加大接收缓冲区，突发流量在事件循环处理前不至于被内核丢弃
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.config["UDP_RECV_BUFFER_SIZE"])
+            except OSError as e:
+                logging.warning("无法设置 UDP 接收缓冲区大小: %s", e)
+            sock.setblocking(False)
+            sock.bind((host, port))
+            if HAS_RECVMMSG:
+                try:
+                    self.loop.add_reader(sock.fileno(), self._on_readable, sock.fileno())
+                except NotImplementedError:
+                    pass
+                else:
+                    self._sock = sock
+                    self._receiver = RecvMmsg()
+                    if HAS_SENDMMSG:
+                        self._sock_fd = sock.fileno()
+                    return
+            self.transport, _ = self.loop.run_until_complete(
+                self.loop.create_datagram_endpoint(lambda: self, sock=sock)
+            )
+        except BaseException:
+            sock.close()
+            raise
+
+    def _close_socket(self):
+        self.loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        self._sock_fd = None
+        self._receiver = None
 
     # --- Background tasks ---
     async def auto_find_nodes(self):
         while self.__running:
-            for host, port in BOOTSTRAP_NODES:
-                await self.find_node(addr=(host, port))
+            # 有引导节点尚未解析成功（例如启动时 DNS 不可用）时，每轮都重新解析
+            if len(self._bootstrap_addrs) < len(self._bootstrap_nodes):
+                await self._resolve_bootstrap()
+            # 每轮重新开始，使节点在一段时间后可以再次被探测
+            self._probed_nodes.clear()
+            for addr in self._bootstrap_addrs.values():
+                self.send_find_node(addr)
             await asyncio.sleep(self.config["FIND_NODES_INTERVAL"])
 
+    async def _refresh_bootstrap_addrs(self):
+        while self.__running:
+            await asyncio.sleep(self.config["BOOTSTRAP_RESOLVE_INTERVAL"])
+            await self._resolve_bootstrap()
+
+    async def _sync_bloom_filter(self):
+        while self.__running:
+            await asyncio.sleep(self.config["BLOOM_FILTER_SYNC_INTERVAL"])
+            if self.__running:
+                self.seen_info_hashes.flush()
+
     async def _report_status(self):
         while self.__running:
             logging.info(
@@ -82,15 +180,59 @@ class Spider(asyncio.DatagramProtocol):
             await asyncio.sleep(self.config["STATUS_REPORT_INTERVAL"])
 
     # --- DatagramProtocol implementation ---
+    # 仅在回退到 create_datagram_endpoint 时使用
     def connection_made(self, transport):
         self.transport = transport
+        self._sock_fd = None
+        if HAS_SENDMMSG:
+            sock = transport.get_extra_info('socket')
+            fd = sock.fileno() if sock is not None else None
+            if isinstance(fd, int) and fd >= 0:
+                self._sock_fd = fd
+
+    def connection_lost(self, exc):
+        self._sock_fd = None
 
     def datagram_received(self, data, addr):
+        # 处理期间产生的响应只入队，处理结束后统一发送
+        self._draining = True
+        try:
+            self._handle_datagram(data, addr)
+        finally:
+            self._draining = False
+            self._flush()
+
+    def _on_readable(self, fd):
+        try:
+            packets = self._receiver.recv(fd)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            # 例如 ICMP 端口不可达引起的 ECONNREFUSED，忽略即可
+            logging.debug("recvmmsg 出错: %s", e)
+            return
+
+        self._draining = True
+        try:
+            for data, addr in packets:
+                self._handle_datagram(data, addr)
+        finally:
+            self._draining = False
+            self._flush()
+
+    def _handle_datagram(self, data, addr):
+        # KRPC 消息总是 bencode 字典；超长或不以 'd' 开头的数据报直接丢弃，
+        # 与 recvmmsg 路径丢弃截断数据报的上限一致
+        if len(data) > MSG_BUFSIZE or data[:1] != b'd':
+            return
         try:
             msg = bencoder.bdecode(data)
         except Exception:
             return
-        self.handle_message(msg, addr)
+        try:
+            self.handle_message(msg, addr)
+        except Exception as e:
+            logging.debug("处理来自 %s 的消息出错: %s", addr, e)
 
     # --- Message Handling ---
     def handle_message(self, msg, addr):
@@ -98,113 +240,218 @@ class Spider(asyncio.DatagramProtocol):
         if msg_type == b'r':
             self.handle_response(msg, addr)
         elif msg_type == b'q':
-            asyncio.ensure_future(self.handle_query(msg, addr), loop=self.loop)
+            self.handle_query(msg, addr)
 
     def handle_response(self, msg, addr):
         args = msg.get(b'r', {})
         if b'nodes' in args:
+            # 节点地址已是数字形式的 IP，无需再经过 getaddrinfo 和独立的任务
+            # 最近已探测过的节点不再重复发送 find_node
+            probed = self._probed_nodes
             for node_id, ip, port in decode_nodes(args[b'nodes']):
-                asyncio.ensure_future(self.find_node(addr=(ip, port)), loop=self.loop)
-
-    async def handle_query(self, msg, addr):
-        args = msg.get(b'a', {})
-        sender_id = args.get(b'id')
+                node_addr = (ip, port)
+                if port and node_addr not in probed:
+                    probed.add(node_addr)
+                    self.send_find_node(node_addr)
+            if len(probed) > self._probed_nodes_limit:
+                probed.clear()
+
+    def handle_query(self, msg, addr):
         query_type = msg.get(b'q')
-        target = None
-
-        logging.debug("收到来自 %s 的查询: %s", addr, query_type.decode(errors='ignore'))
-
-        if query_type == b'get_peers':
-            info_hash = args[b'info_hash']
-            target = info_hash
-            token = info_hash[:2]
-            self.send_message({
-                "t": msg[b"t"], "y": "r",
-                "r": {"id": self._fake_node_id(info_hash), "nodes": "", "token": token}
-            }, addr)
-
-        elif query_type == b'announce_peer':
-            info_hash = args.get(b'info_hash')
-            if info_hash:
-                target = info_hash
-            self.send_message({
-                "t": msg[b"t"], "y": "r", "r": {"id": self._fake_node_id(sender_id)}
-            }, addr)
-
-            if info_hash and info_hash not in self.seen_info_hashes:
-                peer_addr = self._get_peer_addr(args, addr)
-                if peer_addr:
-                    await self.fetch_metadata(info_hash, peer_addr)
-
-        elif query_type == b'find_node':
-            query_target = args.get(b'target')
-            target = query_target
-            self.send_message({
-                "t": msg[b"t"], "y": "r",
-                "r": {"id": self._fake_node_id(query_target), "nodes": ""}
-            }, addr)
-
-        elif query_type == b'ping':
-            self.send_message({
-                "t": msg[b"t"], "y": "r", "r": {"id": self._fake_node_id(sender_id)}
-            }, addr)
-
-        await self.find_node(addr=addr, target=target)
+        logging.debug("收到来自 %s 的查询: %s", addr, query_type)
+
+        # 按查询类型查表分发，处理函数返回下一步 find_node 的目标
+        handler = self._query_handlers.get(query_type)
+        target = handler(msg, msg.get(b'a', {}), addr) if handler else None
+        self.send_find_node(addr, target)
+
+    def _on_get_peers(self, msg, args, addr):
+        info_hash = args[b'info_hash']
+        token = info_hash[:2]
+        self._sendto(krpc.get_peers_response(msg[b"t"], self._fake_node_id(info_hash), token), addr)
+        return info_hash
+
+    def _on_announce_peer(self, msg, args, addr):
+        info_hash = args.get(b'info_hash')
+        self._sendto(krpc.ping_response(msg[b"t"], self._fake_node_id(args.get(b'id'))), addr)
+
+        if info_hash and info_hash not in self.seen_info_hashes:
+            peer_addr = self._get_peer_addr(args, addr)
+            if peer_addr:
+                self._schedule_fetch(info_hash, peer_addr)
+        return info_hash or None
+
+    def _on_find_node(self, msg, args, addr):
+        query_target = args.get(b'target')
+        self._sendto(krpc.find_node_response(msg[b"t"], self._fake_node_id(query_target)), addr)
+        return query_target
+
+    def _on_ping(self, msg, args, addr):
+        self._sendto(krpc.ping_response(msg[b"t"], self._fake_node_id(args.get(b'id'))), addr)
+        return None
 
     # --- Core Logic ---
+    def _schedule_fetch(self, info_hash, address):
+        """
+        将抓取任务放入队列。worker 在第一次调度时启动。
+        已在队列中或正在抓取的 infohash 不会再次入队，未尝试过的新 peer 地址被记录为备选。
+        """
+        pending = self._pending_fetches.get(info_hash)
+        if pending is not None:
+            tried, peers = pending
+            if len(tried) <= self._fetch_peer_limit and address not in tried:
+                tried.add(address)
+                peers.append(address)
+            return
+        if not self._fetch_workers:
+            self._fetch_workers = [
+                self.loop.create_task(self._fetch_worker())
+                for _ in range(self._fetch_worker_count)
+            ]
+        try:
+            self._fetch_queue.put_nowait((info_hash, address))
+            self._pending_fetches[info_hash] = ({address}, collections.deque())
+        except asyncio.QueueFull:
+            logging.debug("抓取队列已满，丢弃 infohash: %s", info_hash.hex())
+
+    async def _fetch_worker(self):
+        while True:
+            info_hash, address = await self._fetch_queue.get()
+            try:
+                # 依次尝试宣告过该 infohash 的 peer，直到成功或没有备选
+                while True:
+                    await self.fetch_metadata(info_hash, address)
+                    peers = self._pending_fetches[info_hash][1]
+                    if not peers or info_hash in self.seen_info_hashes:
+                        break
+                    address = peers.popleft()
+            except Exception as e:
+                logging.error("抓取元数据 %s 时出错: %s", info_hash.hex(), e)
+            finally:
+                self._pending_fetches.pop(info_hash, None)
+
     async def fetch_metadata(self, info_hash, address):
-        async with self.fetcher_semaphore:
-            fetcher = MetadataFetcher(info_hash, address, self.on_metadata_received, self.peer_id)
-            await fetcher.fetch()
+        fetcher = MetadataFetcher(info_hash, address, self.on_metadata_received, self.peer_id)
+        await fetcher.fetch()
 
-    async def on_metadata_received(self, info_hash, metadata):
+    async def on_metadata_received(self, info_hash, metadata, raw_metadata=None):
         try:
             name = metadata.get(b'name', b'Unknown').decode('utf-8', 'ignore')
             logging.info("成功获取元数据: %s (infohash: %s)", name, info_hash.hex())
-            await self.storage.save(info_hash, metadata)
+            await self.storage.save(info_hash, metadata if raw_metadata is None else raw_metadata)
             self.metadata_fetched_count += 1
             self.seen_info_hashes.add(info_hash)
         except Exception as e:
             logging.error("处理或保存元数据时出错: %s", e)
 
     # --- Low-level methods ---
-    def send_message(self, data, addr):
-        data.setdefault(b"t", b"tt")
-        if self.transport:
-            self.transport.sendto(bencoder.bencode(data), addr)
+    def _sendto(self, payload, addr):
+        """
+        将数据报放入发送队列。处理收到的数据报期间由 datagram_received
+        在处理结束后统一发送，否则在本轮事件循环结束时发送。
+        """
+        self._pending.append((payload, addr))
+        if not self._draining and not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._flush)
+
+    def _flush(self):
+        """
+        通过 sendmmsg 批量发送队列中的数据报；不支持或发送失败时，
+        剩余部分交给 transport 逐个发送（由其负责缓冲和错误上报）。
+        直接驱动套接字时没有 transport，剩余部分逐个 sendto，发送失败的数据报直接丢弃。
+        """
+        self._flush_scheduled = False
+        pending = self._pending
+        if not self.transport and self._sock is None:
+            pending.clear()
+            return
 
-    async def find_node(self, addr, target=None):
-        host, port = addr
-        try:
-            res = await self.loop.getaddrinfo(host, port, proto=socket.IPPROTO_UDP)
-            resolved_addr = res[0][4]
-
-            if not target:
-                target = generate_node_id()
-            self.send_message({
-                "t": b"fn", "y": "q", "q": "find_node",
-                "a": {"id": self.node_id, "target": target}
-            }, resolved_addr)
-        except socket.gaierror:
-            logging.warning("无法解析主机: %s", host)
-        except Exception as e:
-            logging.error("find_node to %s:%s 出错: %s", host, port, e)
+        while pending and self._sock_fd is not None:
+            batch = list(itertools.islice(pending, MAX_BATCH))
+            try:
+                sent = sendmmsg(self._sock_fd, batch)
+            except OSError:
+                break
+            except (ValueError, TypeError, OverflowError):
+                if not self._drop_invalid_addrs():
+                    break
+                continue
+            for _ in range(sent):
+                pending.popleft()
+            if sent < len(batch):
+                break
+
+        if self._sock is not None:
+            sock = self._sock
+            while pending:
+                payload, addr = pending.popleft()
+                try:
+                    sock.sendto(payload, addr)
+                except (OSError, ValueError, TypeError, OverflowError) as e:
+                    logging.debug("向 %r 发送数据报失败: %s", addr, e)
+            return
+
+        while pending:
+            payload, addr = pending.popleft()
+            self.transport.sendto(payload, addr)
+
+    def _drop_invalid_addrs(self):
+        """
+        丢弃发送队列中地址不是 (host, port) 二元组或端口越界的数据报。
+        这类地址交给 transport 会导致 transport 被关闭，因此不能走回退路径；
+        主机名形式的地址保留，由回退路径负责解析。返回丢弃的数量。
+        """
+        kept = []
+        for payload, addr in self._pending:
+            try:
+                check_sockaddr(addr)
+            except OSError:
+                pass
+            except (ValueError, TypeError, OverflowError):
+                logging.debug("丢弃发往无效地址 %r 的数据报", addr)
+                continue
+            kept.append((payload, addr))
+        dropped = len(self._pending) - len(kept)
+        self._pending.clear()
+        self._pending.extend(kept)
+        return dropped
+
+    def send_find_node(self, addr, target=None):
+        """
+        向已解析（数字形式）的地址发送 find_node 查询。
+        """
+        if not target:
+            target = generate_node_id()
+        self._sendto(krpc.find_node_query(b"fn", self.node_id, target), addr)
+
+    async def _resolve_bootstrap(self):
+        """
+        并发解析引导节点的主机名。解析失败时保留上一次的结果。
+        """
+        results = await asyncio.gather(*[
+            self.loop.getaddrinfo(host, port, family=socket.AF_INET, proto=socket.IPPROTO_UDP)
+            for host, port in self._bootstrap_nodes
+        ], return_exceptions=True)
+        for (host, port), res in zip(self._bootstrap_nodes, results):
+            if isinstance(res, socket.gaierror):
+                logging.warning("无法解析主机: %s", host)
+            elif isinstance(res, Exception):
+                logging.error("解析引导节点 %s:%s 出错: %s", host, port, res)
+            else:
+                self._bootstrap_addrs[(host, port)] = res[0][4]
 
     def _fake_node_id(self, target_id=None):
         if target_id:
-            return target_id[:-1] + self.node_id[-1:]
+            return target_id[:-1] + self._node_id_last
         return self.node_id
 
     def _load_bloom_filter(self):
-        bloom_file = self.config["BLOOM_FILTER_FILE"]
-        try:
-            with open(bloom_file, 'rb') as f:
-                return BloomFilter.fromfile(f)
-        except FileNotFoundError:
-            return BloomFilter(
-                capacity=self.config["BLOOM_FILTER_CAPACITY"],
-                error_rate=self.config["BLOOM_FILTER_ERROR_RATE"]
-            )
+        return open_bloom_filter(
+            self.config["BLOOM_FILTER_FILE"],
+            self.config["BLOOM_FILTER_CAPACITY"],
+            self.config["BLOOM_FILTER_ERROR_RATE"]
+        )
 
     def _get_peer_addr(self, args, addr):
         port = args.get(b'port') if args.get(b'implied_port', 1) == 0 else addr[1]
@@ -1,15 +1,16 @@
-import asyncio
 import os
-import bencoding
 import logging
 
+from .bencode import bencode
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+
 class Storage:
     """
     用于将获取到的元信息保存为 .torrent 文件。
     """
     def __init__(self, config):
         self.output_dir = config["STORAGE_DIR"]
-        self.lock = asyncio.Lock()
         # 确保输出目录存在
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
@@ -18,19 +19,25 @@ class Storage:
         """
         将元信息保存为 .torrent 文件。
         文件名为 info_hash 的十六进制表示。
+        metadata 可以是解码后的字典，也可以是已经 bencode 编码的字节串（原样写入）。
+        每个种子写入独立的文件，且写入过程中不会让出事件循环，因此无需加锁。
         """
         file_path = os.path.join(self.output_dir, f"{info_hash.hex()}.torrent")
 
-        # 使用异步锁确保文件写入的原子性
-        async with self.lock:
+        try:
+            # 已编码的元数据直接写入，否则先 bencode 编码
+            encoded_metadata = metadata if isinstance(metadata, bytes) else bencode(metadata)
+            # 一次性写入整个文件，直接使用 fd 省去 Python 文件对象及其缓冲区
+            fd = os.open(file_path, _OPEN_FLAGS, 0o644)
             try:
-                # bencode 编码元数据
-                encoded_metadata = bencoding.bencode(metadata)
-                with open(file_path, "wb") as f:
-                    f.write(encoded_metadata)
-                logging.debug("成功保存种子文件: %s", file_path)
-            except Exception as e:
-                logging.error("保存种子文件 %s 时出错: %s", file_path, e, exc_info=True)
+                view = memoryview(encoded_metadata)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            logging.debug("成功保存种子文件: %s", file_path)
+        except Exception as e:
+            logging.error("保存种子文件 %s 时出错: %s", file_path, e, exc_info=True)
 
     def close(self):
         """
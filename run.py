@@ -1,9 +1,12 @@
 import asyncio
 import logging
+import multiprocessing
+import os
 import signal
 import sys
 
 from dhtspider.spider import Spider
+from dhtspider.bloom import open_bloom_filter
 from dhtspider.config import default_config
 
 # --- 日志配置 ---
@@ -25,18 +28,29 @@ else:
     logging.info("在 Windows 平台上运行，使用默认的 asyncio 事件循环。")
 
 
-def main():
+def run_spider(worker_index=0):
     """
-    主函数，负责启动 Spider。
+    在当前进程中运行一个 Spider，直到收到停止信号。
     """
+    if default_config["PIN_CPUS"] and hasattr(os, "sched_setaffinity"):
+        # 每个进程固定在一个 CPU 上，保持缓存局部性
+        cpus = sorted(os.sched_getaffinity(0))
+        cpu = cpus[worker_index % len(cpus)]
+        os.sched_setaffinity(0, {cpu})
+        logging.info("进程 %d 已绑定到 CPU %d。", worker_index, cpu)
+
     loop = asyncio.get_event_loop()
 
     spider = Spider(config=default_config, loop=loop)
 
+    def shutdown():
+        spider.stop()
+        loop.stop()
+
     # 添加信号处理程序以优雅地停止爬虫
     for signame in ('SIGINT', 'SIGTERM'):
         try:
-            loop.add_signal_handler(getattr(signal, signame), spider.stop)
+            loop.add_signal_handler(getattr(signal, signame), shutdown)
         except NotImplementedError:
             pass  # Windows 不支持
 
@@ -58,5 +72,34 @@ def main():
         loop.close()
         logging.info("Spider 已关闭。")
 
+
+def main():
+    """
+    主函数，按配置的进程数量启动 Spider。
+    """
+    workers = default_config["WORKERS"]
+    if workers > 1:
+        # 先在父进程中创建（必要时重建）布隆过滤器文件，避免多个进程同时初始化同一个文件
+        open_bloom_filter(
+            default_config["BLOOM_FILTER_FILE"],
+            default_config["BLOOM_FILTER_CAPACITY"],
+            default_config["BLOOM_FILTER_ERROR_RATE"]
+        ).close()
+
+    children = [
+        multiprocessing.Process(target=run_spider, args=(i,))
+        for i in range(1, workers)
+    ]
+    for child in children:
+        child.start()
+    try:
+        run_spider()
+    finally:
+        # 子进程收到 SIGTERM 后同样会优雅地关闭
+        for child in children:
+            child.terminate()
+        for child in children:
+            child.join()
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,24 @@
+import pytest
+from dhtspider.bencode import bencode, bdecode, BencodeError
+
+
+def test_bencode_roundtrip():
+    """
+    测试编码结果为规范格式（键排序），且能够无损解码。
+    """
+    msg = {"y": "q", "t": b"aa", "q": "ping", "a": {"id": b"x" * 20, "port": 6881, "l": [1, b"b"]}}
+    encoded = bencode(msg)
+    assert encoded == b"d1:ad2:id20:" + b"x" * 20 + b"1:lli1e1:be4:porti6881ee1:q4:ping1:t2:aa1:y1:qe"
+    assert bdecode(encoded) == {
+        b"a": {b"id": b"x" * 20, b"l": [1, b"b"], b"port": 6881},
+        b"q": b"ping", b"t": b"aa", b"y": b"q",
+    }
+
+
+@pytest.mark.parametrize("data", [b"", b"d", b"d1:a", b"i12", b"5:ab", b"x"])
+def test_bdecode_malformed(data):
+    """
+    测试畸形输入统一抛出 BencodeError。
+    """
+    with pytest.raises(BencodeError):
+        bdecode(data)
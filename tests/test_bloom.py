@@ -0,0 +1,45 @@
+import io
+import os
+from dhtspider.bloom import BloomFilter
+
+
+def test_bloom_filter_add_and_persist():
+    """
+    测试布隆过滤器的插入、计数以及通过 tofile/fromfile 持久化。
+    """
+    bloom = BloomFilter(capacity=1000, error_rate=0.001)
+    hashes = [os.urandom(20) for _ in range(100)]
+    for h in hashes:
+        assert bloom.add(h) is False
+    assert bloom.add(hashes[0]) is True
+    assert len(bloom) == 100
+
+    buf = io.BytesIO()
+    bloom.tofile(buf)
+    buf.seek(0)
+    restored = BloomFilter.fromfile(buf)
+
+    assert len(restored) == 100
+    assert all(h in restored for h in hashes)
+    assert sum(os.urandom(20) in restored for _ in range(1000)) < 20
+
+
+def test_bloom_filter_mmap(tmp_path):
+    """
+    测试 open() 得到的过滤器在 close 后重新打开时保留内容，并可被 fromfile 读取。
+    """
+    path = str(tmp_path / "seen.bloom")
+    bloom = BloomFilter.open(path, capacity=1000, error_rate=0.001)
+    hashes = [os.urandom(20) for _ in range(50)]
+    for h in hashes:
+        bloom.add(h)
+    bloom.close()
+
+    reopened = BloomFilter.open(path, capacity=1, error_rate=0.5)
+    assert reopened.capacity == 1000
+    assert len(reopened) == 50
+    assert all(h in reopened for h in hashes)
+    reopened.close()
+
+    with open(path, 'rb') as f:
+        assert len(BloomFilter.fromfile(f)) == 50
@@ -0,0 +1,57 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from dhtspider.bencode import bencode, bdecode
+from dhtspider.fetcher import MetadataFetcher
+
+METADATA = {b'name': b'test.txt', b'length': 1, b'pieces': os.urandom(20) * 1000, b'piece length': 16384}
+METADATA_BCODED = bencode(METADATA)
+INFO_HASH = hashlib.sha1(METADATA_BCODED).digest()
+PEER_UT_METADATA_ID = 3
+
+
+async def _fake_peer(reader, writer):
+    """
+    一个最小的 peer：完成握手后按请求返回元数据片段。
+    """
+    handshake = await reader.readexactly(68)
+    writer.write(handshake[:28] + INFO_HASH + os.urandom(20))
+    ext = bencode({b'm': {b'ut_metadata': PEER_UT_METADATA_ID}, b'metadata_size': len(METADATA_BCODED)})
+    writer.write((len(ext) + 2).to_bytes(4, 'big') + b'\x14\x00' + ext)
+    try:
+        while True:
+            length = int.from_bytes(await reader.readexactly(4), 'big')
+            message = await reader.readexactly(length)
+            if message[0] != 20 or message[1] != PEER_UT_METADATA_ID:
+                continue
+            piece = bdecode(message[2:])[b'piece']
+            data = METADATA_BCODED[piece * 16384:(piece + 1) * 16384]
+            body = bencode({b'msg_type': 1, b'piece': piece, b'total_size': len(METADATA_BCODED)}) + data
+            writer.write((len(body) + 2).to_bytes(4, 'big') + b'\x14\x01' + body)
+            await writer.drain()
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+@pytest.mark.asyncio
+async def test_fetch_success():
+    """
+    测试从 peer 获取多个片段的元数据，校验 SHA1 后回调。
+    """
+    server = await asyncio.start_server(_fake_peer, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    received = []
+
+    async def on_metadata(info_hash, metadata, raw_metadata):
+        received.append((info_hash, metadata, raw_metadata))
+
+    async with server:
+        fetcher = MetadataFetcher(INFO_HASH, ('127.0.0.1', port), on_metadata, os.urandom(20))
+        await asyncio.wait_for(fetcher.fetch(), timeout=5)
+
+    assert received == [(INFO_HASH, METADATA, METADATA_BCODED)]
@@ -0,0 +1,27 @@
+import os
+from dhtspider import krpc
+from dhtspider.bencode import bencode
+
+
+def test_response_templates_match_bencode():
+    """
+    测试预编码模板与等价字典的 bencode 结果逐字节一致。
+    """
+    trans_id = b'ab'
+    node_id = os.urandom(20)
+    target = os.urandom(20)
+    token = b'tk'
+
+    assert krpc.find_node_query(trans_id, node_id, target) == bencode(
+        {"t": trans_id, "y": "q", "q": "find_node", "a": {"id": node_id, "target": target}}
+    )
+
+    assert krpc.ping_response(trans_id, node_id) == bencode(
+        {"t": trans_id, "y": "r", "r": {"id": node_id}}
+    )
+    assert krpc.find_node_response(trans_id, node_id) == bencode(
+        {"t": trans_id, "y": "r", "r": {"id": node_id, "nodes": ""}}
+    )
+    assert krpc.get_peers_response(trans_id, node_id, token) == bencode(
+        {"t": trans_id, "y": "r", "r": {"id": node_id, "nodes": "", "token": token}}
+    )
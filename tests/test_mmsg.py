@@ -0,0 +1,61 @@
+import socket
+
+import pytest
+
+from dhtspider.mmsg import sendmmsg, check_sockaddr, RecvMmsg, HAS_SENDMMSG, HAS_RECVMMSG
+
+pytestmark = pytest.mark.skipif(
+    not (HAS_SENDMMSG and HAS_RECVMMSG), reason="libc 不提供 sendmmsg/recvmmsg"
+)
+
+
+@pytest.fixture
+def sockets():
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    sender.bind(('127.0.0.1', 0))
+    yield sender, receiver
+    sender.close()
+    receiver.close()
+
+
+def test_sendmmsg_recvmmsg_roundtrip(sockets):
+    """
+    测试 sendmmsg 一次发送的多个数据报能被 RecvMmsg 一次读出，内容与来源地址正确。
+    """
+    sender, receiver = sockets
+    dest = receiver.getsockname()
+    payloads = [b'a', b'bb' * 100, b'ccc']
+    assert sendmmsg(sender.fileno(), [(p, dest) for p in payloads]) == 3
+
+    packets = RecvMmsg(vlen=8, bufsize=512).recv(receiver.fileno())
+    assert packets == [(p, sender.getsockname()) for p in payloads]
+    with pytest.raises(BlockingIOError):
+        RecvMmsg().recv(receiver.fileno())
+
+
+def test_recvmmsg_skips_truncated(sockets):
+    """
+    测试超过缓冲区大小而被截断的数据报会被丢弃。
+    """
+    sender, receiver = sockets
+    dest = receiver.getsockname()
+    sendmmsg(sender.fileno(), [(b'x' * 100, dest), (b'ok', dest)])
+    assert RecvMmsg(vlen=8, bufsize=16).recv(receiver.fileno()) == [(b'ok', sender.getsockname())]
+
+
+@pytest.mark.parametrize("addr, exc", [
+    (('::1', 6881, 0, 0), ValueError),
+    (('127.0.0.1', 70000), OverflowError),
+    (('host.invalid', 6881), OSError),
+])
+def test_sendmmsg_invalid_address(sockets, addr, exc):
+    """
+    测试无法编码为 IPv4 sockaddr 的地址抛出与 check_sockaddr 相同的异常。
+    """
+    sender, _ = sockets
+    with pytest.raises(exc):
+        check_sockaddr(addr)
+    with pytest.raises(exc):
+        sendmmsg(sender.fileno(), [(b'x', addr)])
@@ -1,23 +1,48 @@
 import pytest
+import pytest_asyncio
 import asyncio
 import os
+import socket
 from unittest.mock import patch, MagicMock, AsyncMock
 from dhtspider.spider import Spider
 from dhtspider.config import default_config
+from dhtspider.bencode import bencode, bdecode
+from dhtspider.mmsg import HAS_SENDMMSG, HAS_RECVMMSG
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+LOOP_FACTORIES = [pytest.param(asyncio.SelectorEventLoop, id="asyncio")]
+if uvloop is not None:
+    LOOP_FACTORIES.append(pytest.param(uvloop.new_event_loop, id="uvloop"))
+
+
+@pytest_asyncio.fixture
+async def spider(tmp_path):
+    """
+    使用临时布隆过滤器文件和模拟 transport 的 Spider。
+    测试结束时取消它启动的任务并关闭布隆过滤器。
+    """
+    config = dict(default_config, BLOOM_FILTER_FILE=str(tmp_path / "seen.bloom"), BLOOM_FILTER_CAPACITY=1000)
+    spider = Spider(config=config, loop=asyncio.get_running_loop())
+    spider.connection_made(MagicMock())
+    yield spider
+    for task in spider._fetch_workers + spider._background_tasks:
+        task.cancel()
+    spider.seen_info_hashes.close()
+
 
 @pytest.mark.asyncio
-async def test_spider_announce_peer_handling():
+async def test_spider_announce_peer_handling(spider):
     """
     测试单体 Spider 类能否正确处理 announce_peer 查询并尝试获取元数据。
     这是一个集成式的单元测试，用于验证核心处理流程。
     """
     # 1. 准备
-    loop = asyncio.get_event_loop()
-    spider = Spider(config=default_config, loop=loop)
-
-    # 模拟 transport 层，避免真实的网络IO
-    mock_transport = MagicMock()
-    spider.connection_made(mock_transport)
+    # fixture 中的 transport 是模拟对象，避免真实的网络IO
+    mock_transport = spider.transport
 
     # 模拟 fetch_metadata 协程，以检查它是否被调用
     spider.fetch_metadata = AsyncMock()
@@ -42,8 +67,8 @@ async def test_spider_announce_peer_handling():
 
     # 3. 执行
     # 直接调用查询处理器，模拟 datagram_received 的效果
-    await spider.handle_query(query_message, address)
-    await asyncio.sleep(0.01)  # 允许 ensure_future 中的任务被调度
+    spider.handle_query(query_message, address)
+    await asyncio.sleep(0.01)  # 允许发送队列刷新以及 ensure_future 中的任务被调度
 
     # 4. 断言
     # 验证响应是否已发送
@@ -52,3 +77,234 @@ async def test_spider_announce_peer_handling():
 
     # 验证爬虫是否尝试获取元数据
     spider.fetch_metadata.assert_called_once_with(info_hash, (address[0], args[b'port']))
+
+
+@pytest.mark.asyncio
+async def test_spider_skips_recently_probed_nodes(spider):
+    """
+    测试 find_node 响应中重复出现的节点只会被探测一次。
+    """
+    mock_transport = spider.transport
+
+    node = os.urandom(20) + bytes([10, 0, 0, 1]) + (6881).to_bytes(2, 'big')
+    response = {b't': b'fn', b'y': b'r', b'r': {b'id': os.urandom(20), b'nodes': node * 2}}
+    spider.handle_response(response, ('127.0.0.1', 1234))
+    spider.handle_response(response, ('127.0.0.1', 1234))
+    await asyncio.sleep(0.01)
+
+    assert mock_transport.sendto.call_count == 1
+    assert mock_transport.sendto.call_args[0][1] == ('10.0.0.1', 6881)
+
+
+@pytest.mark.asyncio
+async def test_spider_skips_seen_info_hash(spider):
+    """
+    测试布隆过滤器中已存在的 infohash 不会再次触发元数据抓取，但仍会正常响应。
+    """
+    mock_transport = spider.transport
+    spider.fetch_metadata = AsyncMock()
+
+    info_hash = os.urandom(20)
+    spider.seen_info_hashes.add(info_hash)
+    query_message = {
+        b't': b't1',
+        b'y': b'q',
+        b'q': b'announce_peer',
+        b'a': {b'info_hash': info_hash, b'id': os.urandom(20), b'port': 5678, b'implied_port': 0}
+    }
+    spider.handle_query(query_message, ('127.0.0.1', 1234))
+    await asyncio.sleep(0.01)
+
+    assert mock_transport.sendto.call_count == 2
+    spider.fetch_metadata.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_spider_retries_fetch_with_other_peers(spider):
+    """
+    测试同一 infohash 的抓取失败后，会换用之后宣告过它的 peer 重试。
+    """
+    gate = asyncio.Event()
+    tried = []
+
+    async def fake_fetch(info_hash, address):
+        tried.append(address)
+        await gate.wait()
+        if address == ('10.0.0.2', 2):
+            spider.seen_info_hashes.add(info_hash)
+
+    spider.fetch_metadata = fake_fetch
+    info_hash = os.urandom(20)
+    for i in (1, 2, 2, 3):
+        spider._schedule_fetch(info_hash, ('10.0.0.%d' % i, i))
+    await asyncio.sleep(0.01)
+    gate.set()
+    await asyncio.sleep(0.01)
+
+    assert tried == [('10.0.0.1', 1), ('10.0.0.2', 2)]
+    assert info_hash not in spider._pending_fetches
+
+
+@pytest.mark.asyncio
+async def test_spider_does_not_retry_failed_peer(spider):
+    """
+    测试正在抓取时同一个 peer 再次宣告，失败后不会重复尝试该 peer。
+    """
+    gate = asyncio.Event()
+    tried = []
+
+    async def fake_fetch(info_hash, address):
+        tried.append(address)
+        await gate.wait()
+
+    spider.fetch_metadata = fake_fetch
+    info_hash = os.urandom(20)
+    spider._schedule_fetch(info_hash, ('10.0.0.1', 1))
+    await asyncio.sleep(0.01)
+    spider._schedule_fetch(info_hash, ('10.0.0.1', 1))
+    gate.set()
+    await asyncio.sleep(0.01)
+
+    assert tried == [('10.0.0.1', 1)]
+    assert info_hash not in spider._pending_fetches
+
+
+@pytest.mark.asyncio
+async def test_spider_bounds_fetch_retries(spider):
+    """
+    测试备选 peer 被取出后不断有新 peer 宣告，总尝试次数仍不超过 1 + FETCHER_MAX_PEERS。
+    """
+    assert spider.config["FETCHER_MAX_PEERS"] == 3
+    tried = []
+    info_hash = os.urandom(20)
+
+    async def fake_fetch(info_hash, address):
+        tried.append(address)
+        # 每次失败前都有一个新的 peer 宣告
+        spider._schedule_fetch(info_hash, ('10.0.1.%d' % len(tried), len(tried)))
+        await asyncio.sleep(0)
+
+    spider.fetch_metadata = fake_fetch
+    spider._schedule_fetch(info_hash, ('10.0.0.1', 1))
+    await asyncio.sleep(0.05)
+
+    assert len(tried) == 4
+    assert len(set(tried)) == 4
+    assert info_hash not in spider._pending_fetches
+
+
+@pytest.mark.parametrize("loop_factory", LOOP_FACTORIES)
+def test_spider_replies_over_udp(tmp_path, loop_factory):
+    """
+    测试 Spider 在真实的事件循环（asyncio 与 uvloop）和 UDP 套接字上能收到查询并回复，
+    支持 recvmmsg 时两种事件循环都走批量接收路径，且关闭后不遗留套接字。
+    """
+    loop = loop_factory()
+    config = dict(default_config, BLOOM_FILTER_FILE=str(tmp_path / "seen.bloom"), BLOOM_FILTER_CAPACITY=1000)
+    spider = Spider(config=config, loop=loop)
+    client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    client.settimeout(2)
+    try:
+        spider.listen(0, host='127.0.0.1')
+        if HAS_RECVMMSG:
+            assert spider._receiver is not None
+            assert spider.transport is None
+            sock = spider._sock
+        else:
+            sock = spider.transport.get_extra_info('socket')
+        port = sock.getsockname()[1]
+        sender_id = os.urandom(20)
+        for i in range(10):
+            ping = bencode({"t": b"p%d" % i, "y": "q", "q": "ping", "a": {"id": sender_id}})
+            client.sendto(ping, ('127.0.0.1', port))
+        loop.run_until_complete(asyncio.sleep(0.1))
+
+        replies = set()
+        while True:
+            try:
+                data, _ = client.recvfrom(2048)
+            except (socket.timeout, BlockingIOError):
+                break
+            msg = bdecode(data)
+            if msg[b'y'] == b'r':
+                replies.add(msg[b't'])
+            client.settimeout(0.2)
+        assert replies == {b"p%d" % i for i in range(10)}
+
+        spider.stop()
+        loop.run_until_complete(asyncio.sleep(0))
+        assert spider._sock is None and spider._receiver is None
+        assert sock.fileno() == -1
+    finally:
+        client.close()
+        loop.close()
+
+
+@pytest.mark.skipif(not HAS_SENDMMSG, reason="libc 不提供 sendmmsg")
+def test_spider_flush_drops_invalid_address(tmp_path):
+    """
+    测试发送队列中无法编码为 IPv4 sockaddr 的地址不会阻塞后续发送，也不会交给 transport。
+    """
+    config = dict(default_config, BLOOM_FILTER_FILE=str(tmp_path / "seen.bloom"), BLOOM_FILTER_CAPACITY=1000)
+    spider = Spider(config=config, loop=MagicMock())
+    spider.transport = MagicMock()
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(2)
+    try:
+        spider._sock_fd = sender.fileno()
+        spider._sendto(b'bad', ('::1', 6881, 0, 0))
+        spider._sendto(b'good', receiver.getsockname())
+        spider._flush()
+
+        assert not spider._pending
+        assert receiver.recvfrom(16)[0] == b'good'
+        spider.transport.sendto.assert_not_called()
+    finally:
+        sender.close()
+        receiver.close()
+        spider.seen_info_hashes.close()
+
+
+@pytest.mark.asyncio
+async def test_spider_retries_bootstrap_resolution(spider):
+    """
+    测试启动时引导节点解析失败后，下一轮节点发现会重新解析，而不是等到定期刷新。
+    """
+    loop = asyncio.get_running_loop()
+    spider._bootstrap_nodes = (("router.example", 6881),)
+    spider.config["FIND_NODES_INTERVAL"] = 0.01
+    spider.send_find_node = MagicMock()
+    lookups = []
+
+    async def fake_getaddrinfo(host, port, **kwargs):
+        lookups.append(host)
+        if len(lookups) == 1:
+            raise socket.gaierror("temporary failure")
+        return [(socket.AF_INET, socket.SOCK_DGRAM, 17, '', ('10.0.0.1', port))]
+
+    with patch.object(loop, 'getaddrinfo', fake_getaddrinfo):
+        spider._Spider__running = True
+        task = loop.create_task(spider.auto_find_nodes())
+        await asyncio.sleep(0.1)
+        spider._Spider__running = False
+        task.cancel()
+
+    assert lookups == ["router.example", "router.example"]
+    spider.send_find_node.assert_called_with(('10.0.0.1', 6881))
+
+
+def test_spider_backs_up_invalid_bloom_file(tmp_path):
+    """
+    测试无法加载的布隆过滤器文件被改名为 .bak 保留，而不是被删除。
+    """
+    bloom_file = tmp_path / "seen.bloom"
+    bloom_file.write_bytes(b"not a bloom filter")
+    config = dict(default_config, BLOOM_FILTER_FILE=str(bloom_file), BLOOM_FILTER_CAPACITY=1000)
+    spider = Spider(config=config, loop=MagicMock())
+    try:
+        assert (tmp_path / "seen.bloom.bak").read_bytes() == b"not a bloom filter"
+        assert len(spider.seen_info_hashes) == 0
+    finally:
+        spider.seen_info_hashes.close()
@@ -0,0 +1,20 @@
+import socket
+from dhtspider.utils import generate_node_id, decode_nodes
+
+
+def test_generate_node_id_unique():
+    """
+    测试生成的节点 ID 长度为 20 字节，且跨越随机字节池边界时仍不重复。
+    """
+    ids = [generate_node_id() for _ in range(5000)]
+    assert all(len(i) == 20 for i in ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_decode_nodes_ignores_trailing_bytes():
+    """
+    测试按 26 字节解码节点，并忽略末尾不完整的数据。
+    """
+    nid = b'n' * 20
+    data = nid + socket.inet_aton('1.2.3.4') + (6881).to_bytes(2, 'big') + b'xyz'
+    assert decode_nodes(data) == [(nid, '1.2.3.4', 6881)]